@@ -1,5 +1,6 @@
 from mangum import Mangum
 from server import app
 
-# Create the Lambda handler
-handler = Mangum(app)
\ No newline at end of file
+# Create the Lambda handler. Mangum would run the app's lifespan on every
+# invocation, closing the shared OpenAI connection pool after each request
+handler = Mangum(app, lifespan="off")
\ No newline at end of file
@@ -1,21 +1,49 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+import httpx
 import os
 from dotenv import load_dotenv
-from typing import Optional, List, Dict
-import uuid
+from typing import Optional, List, Dict, Tuple, TypedDict, NotRequired, TYPE_CHECKING
+import secrets
+import hashlib
+import asyncio
+import threading
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from weakref import WeakValueDictionary
 from context import prompt
 import boto3
-from botocore.exceptions import ClientError
-import json
-from datetime import datetime
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+import orjson
+import msgspec
+from datetime import datetime, timezone
 from pathlib import Path
 # Load environment variables
 load_dotenv()
 
-app = FastAPI()
+# Shared connection pool for the OpenAI API: keep-alive and HTTP/2 multiplexing
+# amortize TCP+TLS setup across concurrent and consecutive /chat calls
+http_client = DefaultAsyncHttpxClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+    timeout=60.0,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await http_client.aclose()
+
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Configure CORS
 origins = os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
@@ -27,76 +55,498 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-client = OpenAI()
+# Compress larger JSON payloads (/sessions, /conversation/{id}) for clients
+# that send Accept-Encoding: gzip; small responses are sent as-is
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
+
+client = AsyncOpenAI(http_client=http_client)
+
+# Built once so the prompt prefix is byte-identical across turns, which is what
+# OpenAI's automatic prompt caching matches on
+SYSTEM_PROMPT = prompt()
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+# Only the most recent turns (user + assistant pairs) are sent to the model. Older
+# turns are dropped in blocks of half that, rather than one per request, so the
+# prompt prefix stays cacheable for many turns between cuts.
+MAX_HISTORY_TURNS = int(os.getenv("MAX_HISTORY_TURNS", "20"))
+
+# Response cache for first turns, where the answer depends only on the system
+# prompt and the message. Exact matches are looked up by hash; otherwise the
+# message embedding is compared against previously answered ones. The semantic
+# tier is opt-in: it costs an embeddings round trip before every first-turn
+# completion that misses the exact cache.
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+EMBEDDING_MODEL = "text-embedding-3-small"
+SYSTEM_HASH = hashlib.blake2b(SYSTEM_PROMPT.encode("utf-8"), digest_size=16).hexdigest()
+
+if SEMANTIC_CACHE or TYPE_CHECKING:
+    # Only the semantic tier needs numpy. It is the optional `semantic` extra, so the
+    # default Lambda package and cold start don't carry it.
+    import numpy as np
+
+RESPONSE_CACHE: "OrderedDict[str, str]" = OrderedDict()
+# Ring buffer of unit-normalized embeddings, (RESPONSE_CACHE_SIZE, dim) and
+# allocated on first insert; row i answers with semantic_responses[i]. Once full,
+# semantic_next is the oldest row, which the next insert overwrites.
+semantic_matrix: Optional["np.ndarray"] = None
+semantic_responses: List[str] = []
+semantic_next = 0
 
 # Memory storage configuration
 USE_S3 = os.getenv("USE_S3", "false").lower() == "true"
 S3_BUCKET = os.getenv("S3_BUCKET", "")
 MEMORY_DIR = os.getenv("MEMORY_DIR", "../memory")
+# Concurrent GetObject calls when listing sessions
+S3_FETCH_WORKERS = 32
 
-# Initialize S3 client if needed
+# Initialize S3 client if needed. The client is thread-safe and is shared by all
+# requests (and the listing thread pool) so TCP/TLS connections are reused across
+# warm invocations; don't create clients per request. The pool must be at least
+# as large as the listing fan-out, otherwise urllib3 discards connections.
 if USE_S3:
-    s3_client = boto3.client("s3")
+    s3_client = boto3.client(
+        "s3",
+        config=Config(
+            max_pool_connections=64,
+            retries={"mode": "adaptive", "max_attempts": 3},
+            tcp_keepalive=True,
+        ),
+    )
+
+# In-memory LRU of parsed conversations keyed by session_id. Each entry keeps the
+# storage version it was read at (S3 ETag / file mtime+size), so a turn written by
+# another Lambda instance or worker is picked up instead of being overwritten.
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1024"))
+CONV_CACHE: "OrderedDict[str, Tuple[Optional[str], List[Dict]]]" = OrderedDict()
+# Storage I/O runs in worker threads, so cache bookkeeping is guarded
+cache_lock = threading.Lock()
+# /chat and /sessions can both find a legacy file of one session at the same time;
+# migrations run one at a time so only one of them converts it
+migrate_lock = threading.Lock()
+
+# One lock per active session so concurrent turns of the same session serialize
+# while different sessions proceed independently. Unused locks are dropped.
+session_locks: "WeakValueDictionary[str, asyncio.Lock]" = WeakValueDictionary()
 
 
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
 
-class ChatResponse(BaseModel):
-    response: str
-    session_id: Optional[str] = None
-
-class Message(BaseModel):
-    role: str
-    content: str
-    timestamp: str
+# Stored message schema. Decoded straight to dicts by msgspec, which parses and
+# validates in one pass in C; encoding stays on orjson. Older saves may have a
+# null content or lack role/content entirely, so those stay lenient.
+# The schema is closed: keys not listed here are dropped on decode, and since
+# conversations are rewritten from decoded data (every S3 save, JSONL migration)
+# they are then gone from storage too. Add a field here before storing it.
+class Message(TypedDict):
+    role: NotRequired[Optional[str]]
+    content: NotRequired[Optional[str]]
+    timestamp: NotRequired[str]
+
+CONVERSATION_DECODER = msgspec.json.Decoder(List[Message])
+MESSAGE_DECODER = msgspec.json.Decoder(Message)
+
+def utc_iso(timestamp: Optional[float] = None) -> str:
+    """UTC time (now by default) as ISO 8601 with a Z suffix"""
+    dt = datetime.now(timezone.utc) if timestamp is None else datetime.fromtimestamp(timestamp, timezone.utc)
+    return dt.isoformat(timespec="milliseconds").replace("+00:00", "Z")
 
 # Memory management
+# S3 stores a conversation as one JSON array, local storage as JSON lines. Each
+# conversation has a small sibling summary so /sessions never parses full histories.
+LINES_SUFFIX = ".jsonl"
+META_SUFFIX = ".meta.json"
+
 def get_memory_path(session_id: str) -> str:
+    """S3 key of a conversation, also the name of a legacy local file"""
     return f"{session_id}.json"
 
-def load_conversation(session_id: str) -> List[Dict]:
-    """Load conversation history form storage. Option local/S3"""
+def get_lines_path(session_id: str) -> str:
+    return f"{session_id}{LINES_SUFFIX}"
+
+def get_meta_path(session_id: str) -> str:
+    return f"{session_id}{META_SUFFIX}"
+
+def get_session_lock(session_id: str) -> asyncio.Lock:
+    lock = session_locks.get(session_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        session_locks[session_id] = lock
+    return lock
+
+def cache_conversation(session_id: str, version: Optional[str], messages: List[Dict]):
+    with cache_lock:
+        CONV_CACHE[session_id] = (version, messages)
+        CONV_CACHE.move_to_end(session_id)
+        while len(CONV_CACHE) > MAX_SESSIONS:
+            CONV_CACHE.popitem(last=False)
+
+def uncache_conversation(session_id: str):
+    with cache_lock:
+        CONV_CACHE.pop(session_id, None)
+
+def read_conversation(session_id: str, version: Optional[str] = None) -> Tuple[Optional[str], Optional[List[Dict]]]:
+    """Read conversation from storage. Returns (version, None) if unchanged since `version`"""
     if USE_S3:
         try:
-            response = s3_client.get_object(Bucket=S3_BUCKET, Key=get_memory_path(session_id))
-            return json.loads(response["Body"].read().decode("utf-8"))
+            # Conditional GET: S3 answers 304 without a body when the ETag still matches
+            extra = {"IfNoneMatch": version} if version else {}
+            response = s3_client.get_object(Bucket=S3_BUCKET, Key=get_memory_path(session_id), **extra)
+            return response["ETag"], CONVERSATION_DECODER.decode(response["Body"].read())
         except ClientError as e:
-            if e.response["Error"]["Code"] == "NoSuchKey":
-                return []
+            code = e.response["Error"]["Code"]
+            if code == "304":
+                return version, None
+            if code == "NoSuchKey":
+                return None, []
             raise
 
     else:
-        #  Local file storage
-        file_path = os.path.join(MEMORY_DIR, get_memory_path(session_id))
+        #  Local file storage: one JSON message per line
+        file_path = os.path.join(MEMORY_DIR, get_lines_path(session_id))
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            if not migrate_local(session_id):
+                return None, []
+            st = os.stat(file_path)
+        current = file_version(st)
+        if current == version:
+            return version, None
+        with open(file_path, "rb") as f:
+            return current, decode_lines(f.read())
+
+def decode_lines(data: bytes) -> List[Dict]:
+    try:
+        return MESSAGE_DECODER.decode_lines(data)
+    except msgspec.ValidationError:
+        # Valid JSON that breaks the schema fails like it does on S3
+        raise
+    except msgspec.DecodeError:
+        # A crash mid-append can leave a torn line; skip lines that aren't JSON
+        messages = []
+        for line in data.splitlines():
+            try:
+                messages.append(MESSAGE_DECODER.decode(line))
+            except msgspec.ValidationError:
+                raise
+            except msgspec.DecodeError:
+                pass
+        return messages
+
+def migrate_local(session_id: str) -> bool:
+    """Convert a `<id>.json` array saved before the JSONL format. Returns False if there is none"""
+    legacy_path = os.path.join(MEMORY_DIR, get_memory_path(session_id))
+    file_path = os.path.join(MEMORY_DIR, get_lines_path(session_id))
+    with migrate_lock:
+        # Migrated by another thread while this one waited
         if os.path.exists(file_path):
-            with open(file_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return []
+            return True
+        try:
+            with open(legacy_path, "rb") as f:
+                messages = CONVERSATION_DECODER.decode(f.read())
+        except FileNotFoundError:
+            # No legacy file, or another process migrated it just now
+            return os.path.exists(file_path)
+        write_local(session_id, messages)
+        try:
+            os.remove(legacy_path)
+        except FileNotFoundError:
+            pass
+    return True
+
+def build_session_meta(messages: List[Dict]) -> Dict:
+    """Summary of a conversation as listed by /sessions"""
+    # Messages are appended in order with timestamps, so the ends normally have them
+    created_ts = messages[0].get("timestamp") if messages else None
+    last_ts = messages[-1].get("timestamp") if messages else None
+    # Legacy data may lack some; scan for the first/last one that has it
+    if messages and not created_ts:
+        created_ts = next((m["timestamp"] for m in messages if m.get("timestamp")), None)
+    if messages and not last_ts:
+        last_ts = next((m["timestamp"] for m in reversed(messages) if m.get("timestamp")), None)
+    return {
+        "message_count": len(messages),
+        "last_message": (messages[-1].get("content") or "")[:200] if messages else None,
+        "created_at": created_ts,
+        "last_message_timestamp": last_ts,
+    }
 
-def save_conversation(session_id: str, messages: List[Dict]):
-    """Save conversation history to storage"""
+def replace_file(path: str, data: bytes):
+    """Write-then-rename so concurrent readers never see a partial file. Each call gets
+    its own temp file, as writers in other threads may be replacing the same path"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def write_local_meta(session_id: str, meta: Dict):
+    replace_file(os.path.join(MEMORY_DIR, get_meta_path(session_id)), orjson.dumps(meta))
+
+def file_version(st: os.stat_result) -> str:
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+def encode_lines(messages: List[Dict]) -> bytes:
+    return b"".join(orjson.dumps(m) + b"\n" for m in messages)
+
+def write_local(session_id: str, messages: List[Dict]) -> str:
+    """Rewrite a whole local conversation. Returns the new file version"""
+    os.makedirs(MEMORY_DIR, exist_ok=True)
+    file_path = os.path.join(MEMORY_DIR, get_lines_path(session_id))
+    replace_file(file_path, encode_lines(messages))
+    version = file_version(os.stat(file_path))
+    write_local_meta(session_id, build_session_meta(messages))
+    return version
+
+def append_local(session_id: str, new_messages: List[Dict]) -> Tuple[Optional[str], str]:
+    """Append new messages to a local conversation. Returns file versions before and after"""
+    os.makedirs(MEMORY_DIR, exist_ok=True)
+    file_path = os.path.join(MEMORY_DIR, get_lines_path(session_id))
+    with open(file_path, "a+b") as f:
+        st = os.fstat(f.fileno())
+        before = file_version(st) if st.st_size else None
+        prefix = b""
+        if st.st_size:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                # Terminate a torn last line so the new messages start on their own line
+                prefix = b"\n"
+        f.write(prefix + encode_lines(new_messages))
+    return before, file_version(os.stat(file_path))
+
+def remove_local_meta(session_id: str):
+    try:
+        os.remove(os.path.join(MEMORY_DIR, get_meta_path(session_id)))
+    except OSError:
+        pass
+
+def write_s3_meta(session_id: str, meta: Dict):
+    s3_client.put_object(
+        Bucket=S3_BUCKET,
+        Key=get_meta_path(session_id),
+        Body=orjson.dumps(meta),
+        ContentType="application/json",
+    )
+
+def write_conversation(session_id: str, messages: List[Dict], new_messages: List[Dict], version: Optional[str]) -> Optional[str]:
+    """Store new messages of a conversation (and its summary) read at `version`.
+    Returns the new storage version, or None if storage no longer matches the cached copy"""
     if USE_S3:
+        # S3 objects can't be appended to; PUT the whole conversation
+        messages = messages + new_messages
+        body = orjson.dumps(messages)
         try:
-            s3_client.put_object(
+            response = s3_client.put_object(
                 Bucket=S3_BUCKET,
                 Key=get_memory_path(session_id),
-                Body=json.dumps(messages, indent=2),
+                Body=body,
                 ContentType="application/json",
             )
-        except:
-            os.makedirs(MEMORY_DIR, exist_ok=True)
-            file_path = os.path.join(MEMORY_DIR, get_memory_path(session_id))
-            with open(file_path, "w") as f:
-                json.dump(messages, f, indent=2)
+        except (BotoCoreError, ClientError):
+            # Keep the same bytes locally as a legacy JSON array; it is migrated to
+            # JSONL (and re-summarized) on first local load
+            memory_dir = Path(MEMORY_DIR)
+            memory_dir.mkdir(exist_ok=True, parents=True)
+            (memory_dir / get_memory_path(session_id)).write_bytes(body)
+            (memory_dir / get_lines_path(session_id)).unlink(missing_ok=True)
+            (memory_dir / get_meta_path(session_id)).unlink(missing_ok=True)
+            return None
+
+        # The conversation is saved; a failed summary write must not trigger the
+        # fallback. Remove the now-stale summary so /sessions rebuilds it instead.
+        try:
+            write_s3_meta(session_id, build_session_meta(messages))
+        except (BotoCoreError, ClientError):
+            try:
+                s3_client.delete_object(Bucket=S3_BUCKET, Key=get_meta_path(session_id))
+            except (BotoCoreError, ClientError):
+                pass
+        return response["ETag"]
+
+    else:
+        # Local file storage: append only the new lines
+        before, after = append_local(session_id, new_messages)
+        if before != version:
+            # Someone else appended since we read it; the cached copy is missing their
+            # lines, so a summary built from it would be wrong too. /sessions rebuilds it.
+            remove_local_meta(session_id)
+            return None
+        # As on S3, the turn is saved; a failed summary write only drops the summary
+        try:
+            write_local_meta(session_id, build_session_meta(messages + new_messages))
+        except OSError:
+            remove_local_meta(session_id)
+        return after
+
+def read_session_meta(session_id: str) -> Optional[Dict]:
+    """Read the stored summary of a conversation, None if it has none"""
+    if USE_S3:
+        try:
+            response = s3_client.get_object(Bucket=S3_BUCKET, Key=get_meta_path(session_id))
+            return orjson.loads(response["Body"].read())
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "NoSuchKey":
+                return None
+            raise
 
     else:
-        # Local file storage
-        os.makedirs(MEMORY_DIR, exist_ok=True)
-        file_path = os.path.join(MEMORY_DIR, get_memory_path(session_id))
-        with open(file_path, "w") as f:
-            json.dump(messages, f, indent=2)
+        try:
+            with open(os.path.join(MEMORY_DIR, get_meta_path(session_id)), "rb") as f:
+                return orjson.loads(f.read())
+        except FileNotFoundError:
+            return None
+
+def get_session_summary(session_id: str, has_meta: bool) -> Dict:
+    meta = read_session_meta(session_id) if has_meta else None
+    if meta is None:
+        # Conversation saved before summaries existed; rebuild it once
+        meta = build_session_meta(load_conversation_sync(session_id))
+        if USE_S3:
+            write_s3_meta(session_id, meta)
+        else:
+            write_local_meta(session_id, meta)
+    return {"session_id": session_id, **meta}
+
+def try_session_summary(session_id: str, has_meta: bool) -> Optional[Dict]:
+    # One corrupt conversation or summary must not fail the whole listing
+    try:
+        return get_session_summary(session_id, has_meta)
+    except ValueError:
+        return None
+
+def load_conversation_sync(session_id: str) -> List[Dict]:
+    """Load conversation history form cache, re-reading storage only if it changed. Option local/S3"""
+    with cache_lock:
+        cached = CONV_CACHE.get(session_id)
+    version, messages = read_conversation(session_id, cached[0] if cached else None)
+    if messages is None:
+        with cache_lock:
+            if session_id in CONV_CACHE:
+                CONV_CACHE.move_to_end(session_id)
+        return cached[1]
+    cache_conversation(session_id, version, messages)
+    return messages
+
+def save_conversation_sync(session_id: str, messages: List[Dict], new_messages: List[Dict]):
+    """Add new messages to a loaded conversation, in storage and in `messages`"""
+    with cache_lock:
+        cached = CONV_CACHE.get(session_id)
+    version = cached[0] if cached and cached[1] is messages else None
+    version = write_conversation(session_id, messages, new_messages, version)
+    messages.extend(new_messages)
+    if version is None:
+        # Don't trust the cached copy; the next load re-reads storage
+        uncache_conversation(session_id)
+    else:
+        cache_conversation(session_id, version, messages)
+
+# Storage I/O is blocking; these keep it off the event loop
+async def load_conversation(session_id: str) -> List[Dict]:
+    return await asyncio.to_thread(load_conversation_sync, session_id)
+
+async def save_conversation(session_id: str, messages: List[Dict], new_messages: List[Dict]):
+    await asyncio.to_thread(save_conversation_sync, session_id, messages, new_messages)
+
+
+# Response cache (only touched from the event loop, so no locking)
+def response_cache_key(message: str) -> str:
+    normalized = message.strip().lower()
+    return hashlib.blake2b(f"{SYSTEM_HASH}:{normalized}".encode("utf-8")).hexdigest()
+
+async def embed_message(message: str) -> Optional["np.ndarray"]:
+    try:
+        result = await client.embeddings.create(model=EMBEDDING_MODEL, input=message)
+    except Exception:
+        # The semantic tier is best effort; a failed embedding is just a miss
+        return None
+    vector = np.asarray(result.data[0].embedding, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+async def lookup_response_cache(conversation: List[Dict], message: str) -> Tuple[Optional[str], Optional[str], Optional["np.ndarray"]]:
+    """Return (cache key, cached response or None, message embedding if one was computed).
+    Only first turns are cached; later answers depend on the conversation"""
+    if conversation:
+        return None, None, None
+    key = response_cache_key(message)
+    cached = RESPONSE_CACHE.get(key)
+    if cached is not None:
+        RESPONSE_CACHE.move_to_end(key)
+        return key, cached, None
+    if not SEMANTIC_CACHE:
+        return key, None, None
+
+    embedding = await embed_message(message)
+    if embedding is None or semantic_matrix is None:
+        return key, None, embedding
+    similarities = semantic_matrix[:len(semantic_responses)] @ embedding
+    best = int(np.argmax(similarities))
+    if similarities[best] >= SEMANTIC_CACHE_THRESHOLD:
+        return key, semantic_responses[best], embedding
+    return key, None, embedding
+
+def store_response_cache(key: str, embedding: Optional["np.ndarray"], response: str):
+    global semantic_matrix, semantic_next
+    RESPONSE_CACHE[key] = response
+    RESPONSE_CACHE.move_to_end(key)
+    while len(RESPONSE_CACHE) > RESPONSE_CACHE_SIZE:
+        RESPONSE_CACHE.popitem(last=False)
+
+    if embedding is not None and RESPONSE_CACHE_SIZE > 0:
+        # Written in place; the matrix is never copied or resized
+        if semantic_matrix is None:
+            semantic_matrix = np.empty((RESPONSE_CACHE_SIZE, embedding.shape[0]), dtype=np.float32)
+        semantic_matrix[semantic_next] = embedding
+        if len(semantic_responses) < RESPONSE_CACHE_SIZE:
+            semantic_responses.append(response)
+        else:
+            semantic_responses[semantic_next] = response
+        semantic_next = (semantic_next + 1) % RESPONSE_CACHE_SIZE
+
+
+def history_window(conversation: List[Dict]) -> List[Dict]:
+    """Between MAX_HISTORY_TURNS / 2 and MAX_HISTORY_TURNS recent turns; the start
+    only moves when a whole block of older turns is dropped"""
+    if MAX_HISTORY_TURNS <= 0:
+        return []
+    limit = 2 * MAX_HISTORY_TURNS
+    if len(conversation) <= limit:
+        return conversation
+    block = 2 * ((MAX_HISTORY_TURNS + 1) // 2)
+    # Round the start up to a block boundary
+    start = -(-(len(conversation) - limit) // block) * block
+    return conversation[start:]
+
+def build_model_messages(conversation: List[Dict], user_message: str) -> List[Dict]:
+    # Only pass role/content to the model
+    messages = [SYSTEM_MESSAGE]
+    for msg in history_window(conversation):
+        messages.append({"role": msg.get("role") or "assistant", "content": msg.get("content") or ""})
+
+    # Add current message
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+def new_turn(user_message: str, assistant_response: str) -> List[Dict]:
+    now_iso = utc_iso()
+    return [
+        {"role": "user", "content": user_message, "timestamp": now_iso},
+        {"role": "assistant", "content": assistant_response, "timestamp": now_iso},
+    ]
+
+def sse_event(data, event: Optional[str] = None) -> bytes:
+    # JSON-encoded data keeps newlines in the model output from splitting the event
+    head = f"event: {event}\n".encode("utf-8") if event else b""
+    return head + b"data: " + orjson.dumps(data) + b"\n\n"
 
 
 @app.get("/")
@@ -118,122 +568,157 @@ async def health_check():
     }
 
 
-@app.post("/chat", response_model=ChatResponse)
+@app.post("/chat")
 async def chat(request: ChatRequest):
     try:
-        session_id = request.session_id or str(uuid.uuid4())
-
-        conversation = load_conversation(session_id)
+        session_id = request.session_id or secrets.token_hex(16)
 
-        # Only pass role/content to the model
-        messages = [{"role": "system", "content": prompt()}]
-        for msg in conversation:
-            messages.append({"role": msg.get("role", "assistant"), "content": msg.get("content", "")})
+        async with get_session_lock(session_id):
+            conversation = await load_conversation(session_id)
 
-        # Add current message
-        messages.append({"role": "user", "content": request.message})
+            messages = build_model_messages(conversation, request.message)
+            cache_key, assistant_response, embedding = await lookup_response_cache(conversation, request.message)
 
-        # Call OpenAI api
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages
-        )
+            if assistant_response is None:
+                # Call OpenAI api
+                response = await client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    # Route turns of a session to the same prompt cache
+                    prompt_cache_key=session_id,
+                )
 
-        assistant_response = response.choices[0].message.content
+                # content is None for an empty/refused completion; the API returns a string
+                assistant_response = response.choices[0].message.content or ""
+                if cache_key and assistant_response:
+                    store_response_cache(cache_key, embedding, assistant_response)
 
-        # Update conversation history
-        now_iso = datetime.utcnow().isoformat() + "Z"
-        conversation.append({"role": "user", "content": request.message, "timestamp": now_iso})
-        conversation.append({"role": "assistant", "content": assistant_response, "timestamp": datetime.utcnow().isoformat() + "Z"})
+            # Update conversation history (only the new messages are written)
+            new_messages = new_turn(request.message, assistant_response)
+            await save_conversation(session_id, conversation, new_messages)
 
-        save_conversation(session_id, conversation)
-
-        return ChatResponse(
-            response=assistant_response,
-            session_id=session_id
-        )
+        # Already JSON-safe; skip response_model validation and jsonable_encoder
+        return ORJSONResponse(content={"response": assistant_response, "session_id": session_id})
 
     except Exception as e: 
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/sessions")
-async def list_sessions():
-    """List all conversation sessions"""
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Same as /chat, but streams the reply as Server-Sent Events:
+    a `session` event, one data event per text delta, then `done` (or `error`)"""
+    session_id = request.session_id or secrets.token_hex(16)
+
+    async def events():
+        yield sse_event({"session_id": session_id}, "session")
+        try:
+            async with get_session_lock(session_id):
+                conversation = await load_conversation(session_id)
+                messages = build_model_messages(conversation, request.message)
+                cache_key, assistant_response, embedding = await lookup_response_cache(conversation, request.message)
+
+                if assistant_response is not None:
+                    yield sse_event(assistant_response)
+                else:
+                    parts = []
+                    stream = await client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=messages,
+                        prompt_cache_key=session_id,
+                        stream=True,
+                    )
+                    async for chunk in stream:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            parts.append(delta)
+                            yield sse_event(delta)
+                    assistant_response = "".join(parts)
+                    if cache_key and assistant_response:
+                        store_response_cache(cache_key, embedding, assistant_response)
+
+                # Persisted only once the reply is complete
+                new_messages = new_turn(request.message, assistant_response)
+                await save_conversation(session_id, conversation, new_messages)
+            yield sse_event({}, "done")
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            yield sse_event({"detail": str(e)}, "error")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+def collect_sessions() -> List[Dict]:
     sessions = []
     if USE_S3:
         try:
-            resp = s3_client.list_objects_v2(Bucket=S3_BUCKET)
-            for obj in resp.get("Contents", []):
-                key = obj["Key"]
-                if key.endswith(".json"):
-                    session_id = Path(key).stem
-                    conv = load_conversation(session_id)
-                    created_ts = None
-                    last_ts = None
-                    if conv:
-                        # Find first with timestamp and last with timestamp if available
-                        for m in conv:
-                            if m.get("timestamp"):
-                                created_ts = m["timestamp"]
-                                break
-                        for m in reversed(conv):
-                            if m.get("timestamp"):
-                                last_ts = m["timestamp"]
-                                break
-                    sessions.append({
-                        "session_id": session_id,
-                        "message_count": len(conv),
-                        "last_message": conv[-1]["content"] if conv else None,
-                        "created_at": created_ts,
-                        "last_message_timestamp": last_ts,
-                    })
+            # list_objects_v2 returns at most 1000 keys per call
+            session_ids = []
+            meta_ids = set()
+            paginator = s3_client.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=S3_BUCKET):
+                for obj in page.get("Contents", []):
+                    key = obj["Key"]
+                    if key.endswith(META_SUFFIX):
+                        meta_ids.add(key[:-len(META_SUFFIX)])
+                    elif key.endswith(".json"):
+                        session_ids.append(Path(key).stem)
+
+            # Fetch summaries concurrently over the shared (thread-safe) client
+            with ThreadPoolExecutor(max_workers=S3_FETCH_WORKERS) as ex:
+                summaries = ex.map(lambda sid: try_session_summary(sid, sid in meta_ids), session_ids)
+                sessions = [s for s in summaries if s is not None]
         except ClientError:
             pass
     else:
-        for file_path in Path(MEMORY_DIR).glob("*.json"):
-            session_id = file_path.stem
-            with open(file_path, "r", encoding="utf-8") as f:
-                conversation = json.load(f)
-                created_ts = None
-                last_ts = None
-                if conversation:
-                    for m in conversation:
-                        if m.get("timestamp"):
-                            created_ts = m["timestamp"]
-                            break
-                    for m in reversed(conversation):
-                        if m.get("timestamp"):
-                            last_ts = m["timestamp"]
-                            break
-                # Fallback to file times if no timestamps present
-                if not created_ts:
-                    try:
-                        created_ts = datetime.utcfromtimestamp(file_path.stat().st_ctime).isoformat() + "Z"
-                    except Exception:
-                        created_ts = None
-                if not last_ts:
+        try:
+            with os.scandir(MEMORY_DIR) as it:
+                entries = list(it)
+        except FileNotFoundError:
+            entries = []
+        meta_ids = {e.name[:-len(META_SUFFIX)] for e in entries if e.name.endswith(META_SUFFIX)}
+        # Conversations not yet migrated from the JSON array format are listed too
+        conversations = {}
+        for entry in entries:
+            if entry.name.endswith(LINES_SUFFIX):
+                conversations[entry.name[:-len(LINES_SUFFIX)]] = entry
+            elif entry.name.endswith(".json") and not entry.name.endswith(META_SUFFIX):
+                conversations.setdefault(entry.name[:-len(".json")], entry)
+
+        for session_id, entry in conversations.items():
+            session = try_session_summary(session_id, session_id in meta_ids)
+            if session is None:
+                continue
+            # Fallback to file times if no timestamps present (one stat for both)
+            if not session["created_at"] or not session["last_message_timestamp"]:
+                try:
                     try:
-                        last_ts = datetime.utcfromtimestamp(file_path.stat().st_mtime).isoformat() + "Z"
-                    except Exception:
-                        last_ts = None
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        # Migrated to JSONL while its summary was rebuilt
+                        st = os.stat(os.path.join(MEMORY_DIR, get_lines_path(session_id)))
+                    session["created_at"] = session["created_at"] or utc_iso(st.st_ctime)
+                    session["last_message_timestamp"] = session["last_message_timestamp"] or utc_iso(st.st_mtime)
+                except OSError:
+                    pass
+
+            sessions.append(session)
+    return sessions
+
 
-                sessions.append({
-                    "session_id": session_id,
-                    "message_count": len(conversation),
-                    "last_message": conversation[-1]["content"] if conversation else None,
-                    "created_at": created_ts,
-                    "last_message_timestamp": last_ts,
-                })
-    return {"sessions": sessions}
+@app.get("/sessions")
+async def list_sessions():
+    """List all conversation sessions"""
+    sessions = await asyncio.to_thread(collect_sessions)
+    return ORJSONResponse(content={"sessions": sessions})
 
 
 @app.get("/conversation/{session_id}")
 async def get_conversation(session_id: str):
     """Retrieve conversation history"""
     try:
-        conversation = load_conversation(session_id)
-        return {"session_id": session_id, "messages": conversation}
+        conversation = await load_conversation(session_id)
+        return ORJSONResponse(content={"session_id": session_id, "messages": conversation})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -16,29 +16,54 @@ Behavior:
 from __future__ import annotations
 
 import argparse
+import asyncio
 import os
 import shutil
+import signal
 import subprocess
 import sys
 from pathlib import Path
-import threading
 
 
-def _stream_output(prefix: str, proc: subprocess.Popen) -> None:
-    def _reader(stream):
+async def _pump(prefix: str, proc: asyncio.subprocess.Process) -> None:
+    if proc.stdout is None:
+        return
+    while True:
         try:
-            for line in iter(stream.readline, ""):
-                if not line:
-                    break
-                msg = line.rstrip()
-                if msg:
-                    print(f"[{prefix}] {msg}")
-        except Exception:
-            pass
-    # attach readers
-    if proc.stdout is not None:
-        t = threading.Thread(target=_reader, args=(proc.stdout,), daemon=True)
-        t.start()
+            line = await proc.stdout.readline()
+        except ValueError:
+            # Line exceeded the stream limit and was dropped; keep draining the pipe
+            continue
+        if not line:
+            break
+        msg = line.decode(errors="replace").rstrip()
+        if msg:
+            print(f"[{prefix}] {msg}")
+
+
+def _signal(proc: asyncio.subprocess.Process, force: bool = False) -> None:
+    if os.name == "nt":
+        if proc.returncode is None:
+            proc.kill() if force else proc.terminate()
+        return
+    # Signal the whole process group (see _NEW_GROUP): helpers the child started, such
+    # as the `next dev` worker, would otherwise outlive it and keep its output pipe open
+    try:
+        os.killpg(proc.pid, signal.SIGKILL if force else signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+
+async def _stop(proc: asyncio.subprocess.Process | None, timeout: float = 5.0) -> None:
+    if proc is None:
+        return
+    # Even if the child itself has exited, what it started may still be running
+    _signal(proc)
+    try:
+        await asyncio.wait_for(proc.wait(), timeout)
+    except asyncio.TimeoutError:
+        _signal(proc, force=True)
+        await proc.wait()
 
 
 def which(cmd: str) -> str | None:
@@ -116,79 +141,84 @@ def main() -> int:
     print(f"🌐 Frontend  http://localhost:{args.frontend_port}")
     print("")
 
+    try:
+        return asyncio.run(
+            _run(backend_cmd, frontend_cmd, backend_dir, frontend_dir, env_backend, env_frontend)
+        )
+    except KeyboardInterrupt:
+        print("\n🛑 Ctrl+C received, stopping...")
+        return 0
+
+
+# Each child leads its own process group so _stop can signal everything it started
+_NEW_GROUP = {} if os.name == "nt" else {"start_new_session": True}
+
+
+async def _run(
+    backend_cmd: list[str],
+    frontend_cmd: list[str],
+    backend_dir: Path,
+    frontend_dir: Path,
+    env_backend: dict[str, str],
+    env_frontend: dict[str, str],
+) -> int:
+    # Both processes' output is pumped by this one event loop
+    pipes = {"stdout": asyncio.subprocess.PIPE, "stderr": asyncio.subprocess.STDOUT, "limit": 1 << 20, **_NEW_GROUP}
     backend_proc = None
     frontend_proc = None
+    pumps = []
 
     try:
         # Backend: spawn normally
-        backend_proc = subprocess.Popen(
-            backend_cmd,
-            cwd=str(backend_dir),
-            env=env_backend,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
+        backend_proc = await asyncio.create_subprocess_exec(
+            *backend_cmd, cwd=str(backend_dir), env=env_backend, **pipes
         )
-        _stream_output("Backend", backend_proc)
+        pumps.append(asyncio.create_task(_pump("Backend", backend_proc)))
 
-        # Ensure frontend deps installed if missing
+        # Ensure frontend deps installed if missing (backend output keeps flowing meanwhile)
         node_modules_dir = frontend_dir / "node_modules"
         if not node_modules_dir.exists():
             print("📦 Installing frontend dependencies...")
             install_cmd = "npm install" if os.name != "nt" else "npm.cmd install"
-            subprocess.run(install_cmd, cwd=str(frontend_dir), env=env_frontend, shell=True, check=True)
-
-        # Frontend: on Windows npm is a .cmd, use shell=True to ensure it launches
-        is_windows = os.name == "nt"
-        if is_windows:
-            frontend_cmd_str = " ".join(frontend_cmd)
-            frontend_proc = subprocess.Popen(
-                frontend_cmd_str,
-                cwd=str(frontend_dir),
-                env=env_frontend,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
+            install_proc = await asyncio.create_subprocess_shell(install_cmd, cwd=str(frontend_dir), env=env_frontend)
+            if await install_proc.wait() != 0:
+                raise subprocess.CalledProcessError(install_proc.returncode, install_cmd)
+
+        # Frontend: on Windows npm is a .cmd, launch it through the shell
+        if os.name == "nt":
+            frontend_proc = await asyncio.create_subprocess_shell(
+                " ".join(frontend_cmd), cwd=str(frontend_dir), env=env_frontend, **pipes
             )
         else:
-            frontend_proc = subprocess.Popen(
-                frontend_cmd,
-                cwd=str(frontend_dir),
-                env=env_frontend,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
+            frontend_proc = await asyncio.create_subprocess_exec(
+                *frontend_cmd, cwd=str(frontend_dir), env=env_frontend, **pipes
             )
-        _stream_output("Frontend", frontend_proc)
-
-        # Wait until one exits
-        while True:
-            b_code = backend_proc.poll()
-            f_code = frontend_proc.poll()
-            if b_code is not None:
-                print(f"⚠️ Backend exited with code {b_code}")
-                if frontend_proc.poll() is None:
-                    frontend_proc.terminate()
-                return b_code
-            if f_code is not None:
-                print(f"⚠️ Frontend exited with code {f_code}")
-                if backend_proc.poll() is None:
-                    backend_proc.terminate()
-                return f_code
-    except KeyboardInterrupt:
-        print("\n🛑 Ctrl+C received, stopping...")
-        return 0
+        pumps.append(asyncio.create_task(_pump("Frontend", frontend_proc)))
+
+        # Wait until one exits, then stop the other
+        waits = {
+            asyncio.create_task(backend_proc.wait()): ("Backend", frontend_proc),
+            asyncio.create_task(frontend_proc.wait()): ("Frontend", backend_proc),
+        }
+        done, pending = await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        finished = done.pop()
+        name, other = waits[finished]
+        code = finished.result()
+        print(f"⚠️ {name} exited with code {code}")
+        await _stop(other)
+        return code
     finally:
         for proc in (frontend_proc, backend_proc):
-            if proc and proc.poll() is None:
-                try:
-                    proc.terminate()
-                except Exception:
-                    pass
+            await _stop(proc)
+        # Pumps end at EOF once the process groups are gone; don't wait forever on
+        # a process that left its group (e.g. via setsid) and still holds a pipe
+        if pumps:
+            _, pending = await asyncio.wait(pumps, timeout=1.0)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
 
 
 if __name__ == "__main__":